@@ -1,15 +1,49 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
-from app.config import DATABASE_URL
+from app.config import get_settings
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+settings = get_settings()
+
+def _async_url(url: str) -> tuple[URL, dict]:
+    """
+    Map a configured URL to its async driver, plus any connect_args the
+    driver needs in place of URL options it doesn't understand
+    """
+    # Render and .env use plain Postgres URLs; route them to the asyncpg driver
+    for prefix in ("postgres://", "postgresql://", "postgresql+psycopg2://"):
+        if url.startswith(prefix):
+            url = "postgresql+asyncpg://" + url[len(prefix):]
+            break
+    parsed = make_url(url)
+    connect_args = {}
+    # Hosted Postgres URLs carry libpq's ?sslmode=; asyncpg takes the same
+    # mode names through its `ssl` argument and rejects `sslmode`
+    if parsed.get_driver_name() == "asyncpg" and "sslmode" in parsed.query:
+        connect_args["ssl"] = parsed.query["sslmode"]
+        parsed = parsed.difference_update_query(["sslmode"])
+    return parsed, connect_args
+
+def _engine_options(url: URL, connect_args: dict) -> dict:
+    options = {"pool_pre_ping": True}
+    # SQLite uses a single-connection/NullPool setup that rejects sizing args
+    if url.get_backend_name() != "sqlite":
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+    # asyncpg keeps prepared statements per connection (default 100); the
+    # compiled-SQL cache is already on in SQLAlchemy and shared by the engine
+    if url.get_driver_name() == "asyncpg":
+        connect_args = {**connect_args, "prepared_statement_cache_size": 500}
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+_url, _connect_args = _async_url(settings.DATABASE_URL)
+engine = create_async_engine(_url, **_engine_options(_url, _connect_args))
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,71 +1,174 @@
+import asyncio
 import os
-import json
+import logging
 import time
+import orjson
 from contextlib import asynccontextmanager
 from datetime import timedelta
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
-
-from app.config import APP_NAME, DATABASE_URL
+from app.config import get_settings
 from app.db.session import Base, engine
 from app.routers import tours
 
 from app.models.chat_models import ChatRequest
 from app.models.itinerary_models import PlanTripRequest, DayPlan, ItineraryResponse
-from app.services.perplexity_service import safe_perplexity_call, safe_itinerary_call
-from app.services.logging_config import setup_logging
+from app.services.perplexity_service import (
+    safe_perplexity_call, safe_itinerary_call, open_perplexity_stream,
+    new_http_client, use_http_client, close_client,
+)
+from app.services.chat_state import MemoryChatStateStore, RedisChatStateStore
+from app.services.rate_limit import RedisSlidingWindowLimiter, TokenBucketLimiter
+from app.services.logging_config import flush_log_listener, log_context, setup_logging, start_log_listener
 
 from pydantic import BaseModel
 from typing import Optional
 
 # ------------------------------------------------------------------------------
-# Logging
+# Settings & logging
 # ------------------------------------------------------------------------------
+settings = get_settings()
 logger = setup_logging()
 
 # ------------------------------------------------------------------------------
 # Rate limiting
 # ------------------------------------------------------------------------------
-limiter = Limiter(key_func=get_remote_address)
+# Per-path limits keyed by client IP: (requests, per seconds). In-process token
+# buckets by default; lifespan swaps in Redis-backed windows when REDIS_URL is
+# set so the budget holds across workers.
+_RATE_LIMIT_RULES: dict[str, tuple[int, float]] = {
+    "/chat": (10, 60.0),
+    "/legacy_chat": (10, 60.0),
+}
+_RATE_LIMITS: dict[str, TokenBucketLimiter | RedisSlidingWindowLimiter] = {
+    path: TokenBucketLimiter(capacity=limit, per_seconds=per_seconds)
+    for path, (limit, per_seconds) in _RATE_LIMIT_RULES.items()
+}
+
+def _window_text(seconds: float) -> str:
+    if seconds % 60 == 0:
+        minutes = int(seconds // 60)
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+    return f"{seconds:g} seconds"
+
+# 429 messages built from the same rules, e.g. "10 per 1 minute"
+_RATE_LIMIT_ERRORS: dict[str, str] = {
+    path: f"Rate limit exceeded: {limit} per {_window_text(per_seconds)}"
+    for path, (limit, per_seconds) in _RATE_LIMIT_RULES.items()
+}
+
+def _client_ip(request: Request) -> str:
+    """
+    Resolve the client IP once per request and memoize it on request.state
+    """
+    ip = getattr(request.state, "client_ip", None)
+    if ip is None:
+        forwarded = request.headers.get("x-forwarded-for") if settings.TRUST_PROXY_HEADERS else None
+        if forwarded:
+            # The proxy appends the address it saw; anything left of it is
+            # client-supplied and could be forged to dodge rate limits
+            ip = forwarded.rsplit(",", 1)[-1].strip()
+        else:
+            client = request.scope.get("client")
+            ip = client[0] if client else "-"
+        request.state.client_ip = ip
+    return ip
+
+async def _evict_idle_buckets(interval: float = 300.0):
+    while True:
+        await asyncio.sleep(interval)
+        for bucket_limiter in _RATE_LIMITS.values():
+            bucket_limiter.evict_idle()
 
 # ------------------------------------------------------------------------------
 # Lifespan
 # ------------------------------------------------------------------------------
 @asynccontextmanager
-async def lifespan(_: FastAPI):
-    if not DATABASE_URL:
-        logger.error("DATABASE_URL is not set, cannot connect to DB")
-        raise RuntimeError("DATABASE_URL must be set before starting the app")
+async def lifespan(app: FastAPI):
+    start_log_listener()
+    eviction = None
+    redis = None
+    # One pooled HTTP/2 client for the app's lifetime, shared by upstream calls
+    app.state.http = new_http_client()
+    use_http_client(app.state.http)
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("Database tables ensured at startup")
-    except Exception as e:
-        logger.error("Failed to create tables at startup", extra={"error": str(e)})
-    yield
+        if not settings.DATABASE_URL:
+            logger.error("DATABASE_URL is not set, cannot connect to DB")
+            raise RuntimeError("DATABASE_URL must be set before starting the app")
+        if settings.ALEMBIC_MANAGED:
+            logger.info("Schema managed by Alembic, skipping create_all")
+        else:
+            try:
+                # checkfirst: one existence probe per table, DDL only if missing
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all, checkfirst=True)
+                logger.info("Database tables ensured at startup")
+            except Exception as e:
+                logger.error("Failed to create tables at startup", extra={"error": str(e)})
+        if settings.REDIS_URL:
+            import redis.asyncio as aioredis
+
+            redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+            app.state.chat_store = RedisChatStateStore(redis)
+            for path, (limit, per_seconds) in _RATE_LIMIT_RULES.items():
+                _RATE_LIMITS[path] = RedisSlidingWindowLimiter(redis, path, limit, per_seconds)
+            logger.info("Chat state and rate limits stored in Redis")
+        else:
+            eviction = asyncio.create_task(_evict_idle_buckets())
+        yield
+    finally:
+        if eviction is not None:
+            eviction.cancel()
+        await close_client()
+        await app.state.http.aclose()
+        if redis is not None:
+            await redis.aclose()
+        await engine.dispose()
+        flush_log_listener()
 
 # ------------------------------------------------------------------------------
 # App creation
 # ------------------------------------------------------------------------------
-app = FastAPI(title=APP_NAME, version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title=settings.APP_NAME,
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
-# SlowAPI integration
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+# Conversation state; lifespan swaps in the Redis store when REDIS_URL is set
+app.state.chat_store = MemoryChatStateStore()
 
-# CORS
+# Compress JSON bodies over 1 KB (tour pages, itineraries); SSE streams are
+# left alone. Registered first so it sits innermost, next to the routes: the
+# http middlewares below re-chunk bodies, which would hide the size from it.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Rate limiting (registered before CORS so 429s still carry CORS headers)
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    path = request.scope["path"]
+    bucket_limiter = _RATE_LIMITS.get(path)
+    if bucket_limiter is not None:
+        if not await bucket_limiter.allow(_client_ip(request)):
+            return ORJSONResponse({"error": _RATE_LIMIT_ERRORS[path]}, status_code=429)
+    return await call_next(request)
+
+# CORS. Explicit lists plus max_age let browsers cache the preflight for a
+# day instead of sending an OPTIONS before every non-simple request.
+_ALLOW_ANY_ORIGIN = "*" in settings.FRONTEND_ORIGINS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # tighten for production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=["*"] if _ALLOW_ANY_ORIGIN else list(settings.FRONTEND_ORIGINS),
+    allow_credentials=not _ALLOW_ANY_ORIGIN,
+    allow_methods=["GET", "POST"],
+    allow_headers=["authorization", "content-type", "if-none-match"],
+    expose_headers=["etag", "x-next-cursor"],
+    max_age=86400,
 )
 
 # Include existing app routers
@@ -74,39 +177,72 @@ app.include_router(tours, tags=["Tours"])
 # ------------------------------------------------------------------------------
 # Request logging middleware
 # ------------------------------------------------------------------------------
+# Health/metrics probes are polled constantly; keep them off the logging path
+# (GET /ping never gets here, _PingShortcut answers it first)
+_EXCLUDED: frozenset[str] = frozenset({"/health", "/healthz", "/metrics"})
+
+def _request_target(scope) -> str:
+    # Path plus query string, e.g. /legacy_chat?stream=true; both are always
+    # in the ASGI scope, unlike the optional raw_path
+    query = scope.get("query_string")
+    return f"{scope['path']}?{query.decode('latin-1')}" if query else scope["path"]
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    logger.info(
-        "Incoming request",
-        extra={"method": request.method, "url": str(request.url), "client_ip": request.client.host},
-    )
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(
-        "Request completed",
-        extra={
-            "method": request.method,
-            "url": str(request.url),
-            "status_code": response.status_code,
-            "process_time": round(process_time, 4),
-        },
-    )
-    return response
+    if request.scope["path"] in _EXCLUDED:
+        return await call_next(request)
+    start = time.perf_counter()
+    # Every record logged while handling this request carries these fields
+    token = log_context.set({
+        "method": request.method,
+        "url": _request_target(request.scope),
+        "client_ip": _client_ip(request),
+    })
+    try:
+        response = await call_next(request)
+        if logger.isEnabledFor(logging.INFO):
+            elapsed = time.perf_counter() - start
+            logger.info(
+                "Request completed",
+                extra={"status_code": response.status_code, "process_time": round(elapsed, 4)},
+            )
+        return response
+    finally:
+        log_context.reset(token)
 
 # ------------------------------------------------------------------------------
 # Health check
 # ------------------------------------------------------------------------------
-@app.get("/ping")
-async def ping():
-    logger.info("Health check requested")
-    return {"status": "ok", "service": "journey-backend"}
+_PING_BODY = b'{"status":"ok","service":"journey-backend"}'
+_PING_START = {
+    "type": "http.response.start",
+    "status": 200,
+    "headers": [(b"content-type", b"application/json"), (b"content-length", b"%d" % len(_PING_BODY))],
+}
+
+class _PingShortcut:
+    """
+    Answer GET/HEAD /ping ahead of every other middleware. Probes are polled
+    constantly; this way they skip rate limiting, CORS, gzip, request
+    logging and routing altogether.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/ping" and scope["method"] in ("GET", "HEAD"):
+            await send(_PING_START)
+            await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else _PING_BODY})
+            return
+        await self.app(scope, receive, send)
+
+# Added last, so it wraps (and runs before) all of the middleware above
+app.add_middleware(_PingShortcut)
 
 # ------------------------------------------------------------------------------
 # Conversational chat state and questions
 # ------------------------------------------------------------------------------
-chat_state = {}
-
 CONVERSATION_QUESTIONS = [
     ("day", "Which day are you planning your tour?"),
     ("location", "Which city/country/region do you want to visit?"),
@@ -119,6 +255,19 @@ CONVERSATION_QUESTIONS = [
     ("dining", "Do you have any dietary restrictions or food interests?"),
     ("special_requests", "Any special requests, accessibility needs, or events you want included?")
 ]
+QUESTION_KEYS = tuple(key for key, _ in CONVERSATION_QUESTIONS)
+QUESTION_BY_KEY = dict(CONVERSATION_QUESTIONS)
+_NON_ANSWER_FIELDS = frozenset({"user_id", "query"})
+
+# Compact template: indentation and pretty-printed JSON only add prompt tokens
+_PROMPT_PREFIX = (
+    "You are a professional travel planner AI. Based on these user preferences, "
+    "create a detailed day-wise itinerary:\n"
+)
+_PROMPT_SUFFIX = "\nReturn just the JSON formatted itinerary without extra text."
+
+# Identical preference sets produce identical prompts; reuse the itinerary for a day
+_ITINERARY_TTL = 24 * 60 * 60
 
 class ChatInput(BaseModel):
     user_id: Optional[str] = "default_user"  # In production: get from actual session or auth
@@ -135,56 +284,61 @@ class ChatInput(BaseModel):
     query: Optional[str] = None
 
 @app.post("/chat")
-@limiter.limit("10/minute")
 async def chat_endpoint(request: Request, chat_input: ChatInput):
     user_id = chat_input.user_id or "default_user"
-    if user_id not in chat_state:
-        chat_state[user_id] = {}
-
-    state = chat_state[user_id]
 
-    # Update conversation state with any new info from client
-    for key, _ in CONVERSATION_QUESTIONS:
-        val = getattr(chat_input, key, None)
-        if val is not None:
-            state[key] = val
+    # Only the answers the client actually sent this turn
+    answers = chat_input.model_dump(exclude_unset=True, exclude_none=True, exclude=_NON_ANSWER_FIELDS)
 
-    # Ask the next unanswered question
-    for key, question in CONVERSATION_QUESTIONS:
-        if key not in state:
-            return {"response": question}
+    # Merge answers and find the next unanswered question in one step; the
+    # store hands back (and clears) the full state once everything is answered
+    next_key, state = await request.app.state.chat_store.advance(user_id, answers, QUESTION_KEYS)
+    if next_key is not None:
+        return {"response": QUESTION_BY_KEY[next_key]}
 
     # All questions answered: create prompt and call Perplexity API
-    prompt = f"""
-You are a professional travel planner AI. Based on these user preferences, create a detailed day-wise itinerary:
-{json.dumps(state, indent=2)}
-Return just the JSON formatted itinerary without extra text.
-"""
+    # (question order, so equal preferences always give the same prompt)
+    preferences = {key: state[key] for key in QUESTION_KEYS}
+    # orjson writes non-ASCII as-is rather than \u escapes: fewer prompt tokens
+    prompt = _PROMPT_PREFIX + orjson.dumps(preferences).decode() + _PROMPT_SUFFIX
 
     try:
-        ai_response = await safe_perplexity_call(prompt)
+        ai_response = await safe_perplexity_call(prompt, ttl=_ITINERARY_TTL)
     except Exception as e:
         logger.error("Perplexity API call failed", exc_info=e)
         ai_response = "Sorry, I couldn't generate the itinerary at this time."
 
-    # Clear conversation state
-    chat_state.pop(user_id, None)
-
     return {"response": ai_response}
 
 # ------------------------------------------------------------------------------
 # Legacy chat endpoint using external AI call (kept for backward compatibility)
 # ------------------------------------------------------------------------------
+async def _sse_events(deltas):
+    # One SSE event per upstream delta; multi-line text needs a data: per line.
+    # Always ends with an explicit marker so clients can tell a complete reply
+    # from one cut short upstream.
+    try:
+        async for delta in deltas:
+            yield "".join(f"data: {line}\n" for line in delta.split("\n")) + "\n"
+    except Exception:
+        # Headers (200) are already sent; report the failure in-band
+        yield "event: error\ndata: Upstream stream interrupted\n\n"
+        return
+    yield "data: [DONE]\n\n"
+
 @app.post("/legacy_chat")
-@limiter.limit("10/minute")
-async def legacy_chat(request: Request, chat_request: ChatRequest):
+async def legacy_chat(request: Request, chat_request: ChatRequest, stream: bool = False):
     logger.info("Chat request received", extra={"query_length": len(chat_request.query or "")})
     q = (chat_request.query or "").strip()
     if q == "":
         logger.info("Empty query short-circuited")
         return {"reply": ""}
     try:
-        reply = safe_perplexity_call(q)
+        if stream:
+            # Opt-in: forward tokens as they arrive instead of waiting for the full reply
+            deltas = await open_perplexity_stream(q)
+            return StreamingResponse(_sse_events(deltas), media_type="text/event-stream")
+        reply = await safe_perplexity_call(q)
         logger.info("Chat response generated successfully")
         return {"reply": reply}
     except HTTPException:
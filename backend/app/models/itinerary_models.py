@@ -5,7 +5,7 @@ from pydantic import BaseModel, Field, model_validator, ConfigDict
 
 class PlanTripRequest(BaseModel):
     # Strip whitespace on all str fields in this model (v2-native)
-    model_config = ConfigDict(str_strip_whitespace=True)
+    model_config = ConfigDict(str_strip_whitespace=True, frozen=True)
 
     city: str = Field(..., min_length=2, max_length=80)
     start_date: date
@@ -13,9 +13,11 @@ class PlanTripRequest(BaseModel):
 
     @model_validator(mode="after")
     def validate_dates(self):
-        if self.end_date < self.start_date:
+        # Ordinal difference: one int subtraction, no timedelta allocation
+        delta = self.end_date.toordinal() - self.start_date.toordinal()
+        if delta < 0:
             raise ValueError("end_date must be on or after start_date")
-        if (self.end_date - self.start_date).days + 1 > 30:
+        if delta >= 30:
             raise ValueError("Trip length cannot exceed 30 days")
         return self
 
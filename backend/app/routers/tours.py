@@ -1,27 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import hashlib
+
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import Field, TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_db
 from app.models import Tour
 from app.schemas import TourCreate, TourOut
+from app.services.cache import TTLLRU
 
 router = APIRouter(prefix="/tours", tags=["tours"])
 
+# Built once; GET handlers encode straight to JSON bytes instead of going
+# through FastAPI's response_model validate/encode pass. response_model stays
+# on the routes for the OpenAPI schema.
+_TOUR_ADAPTER = TypeAdapter(TourOut)
+_TOUR_LIST_ADAPTER = TypeAdapter(list[TourOut])
+
+# Encoded list pages as (body, etag), keyed by (cursor, limit). Writes clear
+# it; the short TTL bounds staleness from other workers' writes.
+_pages = TTLLRU(maxsize=256, ttl=30)
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def _encode(adapter: TypeAdapter, rows) -> tuple[bytes, str]:
+    value = adapter.validate_python(rows, from_attributes=True)
+    body = adapter.dump_json(value)
+    # Serialization is deterministic, so the body hash is a stable validator;
+    # clients revalidate and get a bodiless 304 while nothing has changed
+    return body, f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+def _json(body: bytes, etag: str, request: Request) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.post("/", response_model=TourOut, status_code=201)
-def create_tour(tour: TourCreate, db: Session = Depends(get_db)):
+async def create_tour(tour: TourCreate, db: AsyncSession = Depends(get_db)):
     entity = Tour(**tour.model_dump())
     db.add(entity)
-    db.commit()
-    db.refresh(entity)
+    await db.commit()
+    await db.refresh(entity)
+    _pages.clear()
     return entity
 
+@router.post("/bulk", response_model=list[TourOut], status_code=201)
+async def create_tours(
+    tours: Annotated[list[TourCreate], Field(min_length=1, max_length=500)],
+    db: AsyncSession = Depends(get_db),
+):
+    # One multi-row INSERT ... RETURNING and one commit for the whole batch;
+    # sort_by_parameter_order keeps the returned rows in request order
+    stmt = insert(Tour).returning(Tour, sort_by_parameter_order=True)
+    result = await db.scalars(stmt, [t.model_dump() for t in tours])
+    entities = result.all()
+    await db.commit()
+    _pages.clear()
+    return entities
+
 @router.get("/", response_model=list[TourOut])
-def list_tours(db: Session = Depends(get_db)):
-    return db.query(Tour).all()
+async def list_tours(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor from the previous page"),
+    db: AsyncSession = Depends(get_db),
+):
+    page = _pages.get((cursor, limit))
+    if page is None:
+        # Keyset pagination: walks the primary key index from the cursor
+        stmt = select(Tour).order_by(Tour.id).limit(limit)
+        if cursor is not None:
+            stmt = stmt.where(Tour.id > cursor)
+        result = await db.execute(stmt)
+        rows = result.scalars().all()
+        # A full page may have more after it; callers follow X-Next-Cursor
+        # until it is absent to read the whole list
+        next_cursor = str(rows[-1].id) if len(rows) == limit else None
+        page = (*_encode(_TOUR_LIST_ADAPTER, rows), next_cursor)
+        _pages.set((cursor, limit), page)
+    body, etag, next_cursor = page
+    response = _json(body, etag, request)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 @router.get("/{tour_id}", response_model=TourOut)
-def get_tour(tour_id: int, db: Session = Depends(get_db)):
-    obj = db.get(Tour, tour_id)
+async def get_tour(tour_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    obj = await db.get(Tour, tour_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Tour not found")
-    return obj
+    return _json(*_encode(_TOUR_ADAPTER, obj), request)
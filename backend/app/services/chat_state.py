@@ -0,0 +1,71 @@
+# app/services/chat_state.py
+from typing import Optional, Sequence
+from app.services.cache import TTLLRU
+
+# Merge the client's answers, refresh the TTL and find the next unanswered
+# question in one atomic round-trip. Returns the next key, or the full state
+# (flattened HGETALL) once every question is answered, deleting it.
+#   KEYS[1] = chat:<user_id>
+#   ARGV    = ttl, n_answers, field1, value1, ..., question_key1, question_key2, ...
+_ADVANCE_LUA = """
+local ttl = tonumber(ARGV[1])
+local n = tonumber(ARGV[2])
+local first_key = 3 + n * 2
+if n > 0 then
+  redis.call('HSET', KEYS[1], unpack(ARGV, 3, first_key - 1))
+end
+for i = first_key, #ARGV do
+  if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 0 then
+    if n > 0 then
+      redis.call('EXPIRE', KEYS[1], ttl)
+    end
+    return ARGV[i]
+  end
+end
+local state = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return state
+"""
+
+class RedisChatStateStore:
+    """
+    Conversation state shared by all workers, kept in a Redis hash per user
+    that expires after `ttl` seconds without new answers
+    """
+
+    def __init__(self, redis, ttl: int = 1800):
+        self._ttl = ttl
+        self._advance = redis.register_script(_ADVANCE_LUA)
+
+    async def advance(self, user_id: str, answers: dict, keys: Sequence[str]) -> tuple[Optional[str], Optional[dict]]:
+        args = [self._ttl, len(answers)]
+        for field, value in answers.items():
+            args += (field, value)
+        args.extend(keys)
+        result = await self._advance(keys=[f"chat:{user_id}"], args=args)
+        if isinstance(result, list):
+            return None, dict(zip(result[::2], result[1::2]))
+        return result, None
+
+class MemoryChatStateStore:
+    """
+    Per-process fallback used when no REDIS_URL is configured. Bounded like
+    the Redis store: abandoned conversations expire after `ttl` seconds and
+    at most `maxsize` are kept. advance() never awaits, so it is atomic on
+    the event loop without a lock.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: int = 1800):
+        self._states = TTLLRU(maxsize=maxsize, ttl=ttl)
+
+    async def advance(self, user_id: str, answers: dict, keys: Sequence[str]) -> tuple[Optional[str], Optional[dict]]:
+        state = self._states.get(user_id)
+        if state is None:
+            state = {}
+        state.update(answers)
+        for key in keys:
+            if key not in state:
+                self._states.set(user_id, state)
+                return key, None
+        self._states.pop(user_id)
+        return None, state
@@ -1,27 +1,111 @@
 # app/services/logging_config.py
+import atexit
 import logging
 import os
-from pythonjsonlogger.json import JsonFormatter  # updated import path
+import queue
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from pythonjsonlogger.orjson import OrjsonFormatter  # orjson-backed JsonFormatter
+
+# Records are enqueued on the request path and written out by a background
+# thread, so slow stdout/file I/O never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_listener = None
+_listener_running = False
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records untouched. The stock prepare() interpolates the message
+    and renders tracebacks on the calling thread; leaving that to the
+    listener keeps all formatting off the request path.
+    """
+
+    def prepare(self, record):
+        return record
+
+# Per-request fields (method, url, client_ip) stamped on every record logged
+# while the request is handled; set once by the request middleware
+log_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+class _ContextFilter(logging.Filter):
+    """
+    Copy the current log_context onto the record. Runs on the caller's thread
+    (attached to the queue handler), where the request's context is visible;
+    explicit extras win over context fields.
+    """
+
+    def filter(self, record):
+        for key, value in log_context.get().items():
+            record.__dict__.setdefault(key, value)
+        return True
+
+class _ServiceLogger(logging.LoggerAdapter):
+    """
+    Stamps the service name on every record; caller extras are merged in
+    rather than replacing it
+    """
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get("extra")
+        kwargs["extra"] = self.extra if extra is None else {**self.extra, **extra}
+        return msg, kwargs
+
+_SERVICE_CONTEXT = {"service": "journey-backend"}
 
 def setup_logging():
+    global _listener
     root = logging.getLogger()
 
     # Avoid duplicate handlers in reload/test runs
     if root.handlers:
-        return logging.getLogger(__name__)
+        return _ServiceLogger(logging.getLogger(__name__), _SERVICE_CONTEXT)
 
     root.setLevel(logging.INFO)
 
     if os.getenv("ENV", "dev") == "prod":
-        formatter = JsonFormatter()  # structured JSON in production
+        formatter = OrjsonFormatter()  # structured JSON in production
     else:
         formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
     handler = logging.StreamHandler()
     handler.setFormatter(formatter)
-    root.addHandler(handler)
+    queue_handler = _DeferredQueueHandler(_log_queue)
+    queue_handler.addFilter(_ContextFilter())
+    root.addHandler(queue_handler)
+    _listener = QueueListener(_log_queue, handler, respect_handler_level=True)
+    # Drain from the start so scripts and early failures still get output; the
+    # app lifespan only flushes it, the final stop happens at interpreter exit
+    start_log_listener()
+    atexit.register(stop_log_listener)
 
     # Optional: reduce noise
     logging.getLogger("uvicorn.access").disabled = True
 
-    return logging.getLogger(__name__)
+    return _ServiceLogger(logging.getLogger(__name__), _SERVICE_CONTEXT)
+
+def start_log_listener():
+    """
+    Start draining queued records to the real handlers (idempotent; also
+    restarts it after a previous stop)
+    """
+    global _listener_running
+    if _listener is not None and not _listener_running:
+        _listener.start()
+        _listener_running = True
+
+def stop_log_listener():
+    """
+    Flush any queued records and stop the background thread
+    """
+    global _listener_running
+    if _listener_running:
+        _listener.stop()
+        _listener_running = False
+
+def flush_log_listener():
+    """
+    Write out everything queued so far and keep draining; records logged
+    afterwards (e.g. after app shutdown) are still written
+    """
+    stop_log_listener()
+    start_log_listener()
@@ -1,79 +1,222 @@
-import time
+import asyncio
+import hashlib
+import importlib.util
 import json
+import sys
+from functools import lru_cache
 from typing import Optional
+import httpx
 from fastapi import HTTPException
-from openai import OpenAI
-from app.config import PERPLEXITY_API_KEY
+from app.config import get_settings
+from app.services.cache import TTLLRU
 from app.services.logging_config import setup_logging
 
+def _lazy_import(name: str):
+    """
+    Import a module on first attribute access (importlib's LazyLoader recipe)
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# openai's package tree is large; defer loading it until the first API call
+openai = _lazy_import("openai")
+
+settings = get_settings()
 logger = setup_logging()
-client = OpenAI(api_key=PERPLEXITY_API_KEY, base_url="https://api.perplexity.ai")
 
-def safe_perplexity_call(prompt: str, model: str = "sonar-pro", retries: int = 3, delay: int = 2) -> str:
+# Bursts queue here instead of opening unbounded connections and tripping the
+# provider's rate limit
+_upstream_slots = asyncio.Semaphore(settings.PERPLEXITY_MAX_CONCURRENCY)
+
+def new_http_client() -> httpx.AsyncClient:
+    """
+    Keep-alive HTTP/2 client: concurrent calls multiplex over pooled
+    connections instead of paying a TLS handshake each
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        # openai adopts a non-default client timeout in place of its own 10 min
+        timeout=httpx.Timeout(30.0, connect=5.0),
+    )
+
+# Set by the app lifespan so upstream calls share the app's client
+_http: Optional[httpx.AsyncClient] = None
+
+def use_http_client(http: Optional[httpx.AsyncClient]):
+    global _http
+    _http = http
+    get_client.cache_clear()
+
+@lru_cache(maxsize=1)
+def get_client():
+    return openai.AsyncOpenAI(
+        api_key=settings.PERPLEXITY_API_KEY,
+        base_url=settings.PERPLEXITY_BASE_URL,
+        http_client=_http or new_http_client(),
+    )
+
+async def close_client():
+    """
+    Close the pooled upstream connections, if the client was ever created.
+    A client handed in through use_http_client() is left to its owner.
+    """
+    global _http
+    if get_client.cache_info().currsize:
+        if _http is None:
+            await get_client().close()
+        get_client.cache_clear()
+    _http = None
+
+# Both keyed by prompt hash. Completed replies are reused for a few minutes
+# (or the caller's `ttl`), and identical concurrent prompts await the same
+# pending task instead of each calling the provider, so a miss never stampedes.
+_responses = TTLLRU(maxsize=1024, ttl=300)
+_inflight: dict[bytes, asyncio.Task] = {}
+
+async def safe_perplexity_call(
+    prompt: str,
+    model: str = settings.PERPLEXITY_MODEL,
+    retries: int = 3,
+    delay: int = 2,
+    ttl: Optional[float] = None,
+) -> str:
     """
-    Make a safe call to Perplexity API with error handling and retries
+    Make a safe call to Perplexity API with error handling and retries.
+    Repeated or concurrent calls for the same model + prompt share one
+    upstream request; `ttl` overrides how long the reply is reused.
     """
+    key = hashlib.blake2b(f"{model}\0{prompt}".encode(), digest_size=16).digest()
+    cached = _responses.get(key)
+    if cached is not None:
+        return cached
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch(key, prompt, model, retries, delay, ttl))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield so one caller disconnecting doesn't cancel the call for the others
+    return await asyncio.shield(task)
+
+async def _fetch(key: bytes, prompt: str, model: str, retries: int, delay: int, ttl: Optional[float]) -> str:
+    result = await _call_with_retries(prompt, model, retries, delay)
+    _responses.set(key, result, ttl)
+    return result
+
+async def _call_with_retries(prompt: str, model: str, retries: int, delay: int) -> str:
     for attempt in range(retries):
         try:
             logger.info("Making Perplexity API call", extra={"attempt": attempt + 1, "model": model})
             
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-            )
+            async with _upstream_slots:
+                response = await get_client().chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0,
+                )
             
             result = response.choices[0].message.content
             logger.info("Perplexity API call successful", extra={"response_length": len(result)})
             return result
             
-        except Exception as e:
-            error_str = str(e)
+        except openai.RateLimitError as e:
+            logger.error("Perplexity API rate limited", extra={
+                "attempt": attempt + 1,
+                "error": str(e),
+                "retries_left": retries - attempt - 1
+            })
+            if attempt < retries - 1:
+                wait_time = delay * (1 << attempt)  # exponential backoff
+                logger.warning("Rate limited, waiting %ss before retry", wait_time)
+                await asyncio.sleep(wait_time)
+                continue
+            raise HTTPException(
+                status_code=429,
+                detail="API rate limit exceeded. Please try again later."
+            )
+
+        except openai.APIError as e:
             logger.error("Perplexity API call failed", extra={
                 "attempt": attempt + 1,
-                "error": error_str,
+                "error": str(e),
                 "retries_left": retries - attempt - 1
             })
-            
-            # Handle rate limiting (429)
-            if "429" in error_str or "rate limit" in error_str.lower():
-                if attempt < retries - 1:
-                    wait_time = delay * (2 ** attempt)  # exponential backoff
-                    logger.warning(f"Rate limited, waiting {wait_time}s before retry")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    raise HTTPException(
-                        status_code=429, 
-                        detail="API rate limit exceeded. Please try again later."
-                    )
-            
-            # Handle other API errors
             if attempt == retries - 1:
                 logger.error("All Perplexity API attempts failed")
                 raise HTTPException(
                     status_code=500,
                     detail="External API service temporarily unavailable. Please try again later."
                 )
-    
+
     # This shouldn't be reached, but just in case
     raise HTTPException(status_code=500, detail="Unexpected error in API service")
 
-def safe_itinerary_call(system_msg: str, user_prompt: str) -> str:
+async def open_perplexity_stream(prompt: str, model: str = settings.PERPLEXITY_MODEL):
+    """
+    Start a streaming completion and return an async iterator of text deltas.
+    Failures to connect surface here, before any response bytes are sent.
+    """
+    try:
+        logger.info("Opening Perplexity API stream", extra={"model": model})
+        # Gates opening the stream; the body is then read as the client consumes it
+        async with _upstream_slots:
+            stream = await get_client().chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0,
+                stream=True,
+            )
+    except openai.RateLimitError:
+        logger.error("Perplexity API stream rate limited")
+        raise HTTPException(
+            status_code=429,
+            detail="API rate limit exceeded. Please try again later."
+        )
+    except Exception as e:
+        logger.error("Perplexity API stream failed to open", extra={"error": str(e)})
+        raise HTTPException(
+            status_code=500,
+            detail="External API service temporarily unavailable. Please try again later."
+        )
+    return _iter_stream_deltas(stream)
+
+async def _iter_stream_deltas(stream):
+    try:
+        async for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    except Exception as e:
+        # Headers are already sent at this point; the caller reports it in-band
+        logger.error("Perplexity API stream interrupted", extra={"error": str(e)})
+        raise
+    finally:
+        await stream.close()
+
+async def safe_itinerary_call(system_msg: str, user_prompt: str) -> str:
     """
     Specialized call for itinerary planning with system + user messages
     """
     try:
         logger.info("Making itinerary API call")
         
-        response = client.chat.completions.create(
-            model="sonar-pro",
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            temperature=0,
-        )
+        async with _upstream_slots:
+            response = await get_client().chat.completions.create(
+                model=settings.PERPLEXITY_MODEL,
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": user_prompt.strip()}
+                ],
+                temperature=0,
+            )
         
         result = response.choices[0].message.content
         logger.info("Itinerary API call successful")
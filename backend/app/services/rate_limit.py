@@ -0,0 +1,102 @@
+# app/services/rate_limit.py
+import secrets
+import time
+from typing import Optional
+from app.services.logging_config import setup_logging
+
+logger = setup_logging()
+
+class TokenBucket:
+    __slots__ = ("tokens", "last")
+
+    def __init__(self, tokens: float, last: float):
+        self.tokens = tokens
+        self.last = last
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets holding `capacity` tokens, refilled continuously
+    over `per_seconds`. Refill happens lazily when a key is hit.
+    """
+
+    def __init__(self, capacity: int, per_seconds: float):
+        self.capacity = capacity
+        self.per_seconds = per_seconds
+        self.rate = capacity / per_seconds
+        self.buckets: dict[str, TokenBucket] = {}
+
+    def hit(self, key: str, now: Optional[float] = None) -> bool:
+        """
+        Consume one token for `key`; False means the caller is over the limit
+        """
+        if now is None:
+            now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.capacity, now)
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.last) * self.rate)
+            bucket.last = now
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        return True
+
+    async def allow(self, key: str) -> bool:
+        return self.hit(key)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        Drop buckets idle for a full window; they would have refilled to
+        capacity anyway, so this never changes a limiting decision
+        """
+        if now is None:
+            now = time.monotonic()
+        cutoff = now - self.per_seconds
+        stale = [key for key, bucket in self.buckets.items() if bucket.last <= cutoff]
+        for key in stale:
+            del self.buckets[key]
+        return len(stale)
+
+# Rolling window over a sorted set of request timestamps: trim entries older
+# than the window, count, and record this request only if under the limit --
+# all in one atomic round-trip.
+#   KEYS[1] = rl:<name>:<client>
+#   ARGV    = now_ms, window_ms, limit, member
+_SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+  redis.call('ZADD', KEYS[1], now, ARGV[4])
+  redis.call('PEXPIRE', KEYS[1], window)
+  return 1
+end
+return 0
+"""
+
+class RedisSlidingWindowLimiter:
+    """
+    `limit` requests per `per_seconds` per key, enforced across all workers
+    sharing the Redis instance
+    """
+
+    def __init__(self, redis, name: str, limit: int, per_seconds: float):
+        self.name = name
+        self.limit = limit
+        self.window_ms = int(per_seconds * 1000)
+        self._script = redis.register_script(_SLIDING_WINDOW_LUA)
+
+    async def allow(self, key: str) -> bool:
+        now_ms = int(time.time() * 1000)
+        member = f"{now_ms}:{secrets.token_hex(4)}"
+        try:
+            allowed = await self._script(
+                keys=[f"rl:{self.name}:{key}"],
+                args=[now_ms, self.window_ms, self.limit, member],
+            )
+        except Exception as e:
+            # Fail open: a Redis outage shouldn't take the endpoints down with it
+            logger.warning("Rate limit check failed, allowing request", extra={"error": str(e)})
+            return True
+        return allowed == 1
@@ -0,0 +1,25 @@
+# gunicorn.conf.py
+import multiprocessing
+import os
+
+from uvicorn_worker import UvicornWorker
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+class JourneyUvicornWorker(UvicornWorker):
+    # Explicit rather than "auto", which silently falls back to asyncio/h11:
+    # a missing uvloop or httptools build fails at boot instead
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "loop": "uvloop", "http": "httptools"}
+
+worker_class = JourneyUvicornWorker
+
+# Chat state and rate limits are only shared between processes through Redis;
+# without REDIS_URL stay on one worker so conversations don't split. LLM calls
+# are I/O-bound and already bounded per worker by PERPLEXITY_MAX_CONCURRENCY.
+_default_workers = max(2, 2 * multiprocessing.cpu_count()) if os.getenv("REDIS_URL") else 1
+workers = int(os.getenv("WEB_CONCURRENCY", _default_workers))
+
+# Long upstream calls are fine: async workers heartbeat independently of requests
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
@@ -0,0 +1,23 @@
+import asyncio
+import fakeredis
+import pytest
+
+@pytest.fixture
+def run_with_redis():
+    """
+    Run `scenario(redis)` to completion against a fresh fakeredis client.
+    fakeredis[lua] executes the real Lua scripts; pass a FakeServer to
+    control the backing server (e.g. disconnect it).
+    """
+
+    def run(scenario, server=None):
+        async def main():
+            redis = fakeredis.FakeAsyncRedis(server=server or fakeredis.FakeServer(), decode_responses=True)
+            try:
+                return await scenario(redis)
+            finally:
+                await redis.aclose()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,36 @@
+from unittest.mock import patch
+from app.services.cache import TTLLRU
+
+def test_cache_hit_and_miss():
+    cache = TTLLRU(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLLRU(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the oldest
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_cache_entries_expire():
+    cache = TTLLRU(maxsize=2, ttl=10)
+    with patch("app.services.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.services.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_per_entry_ttl_overrides_default():
+    cache = TTLLRU(maxsize=2, ttl=10)
+    with patch("app.services.cache.time.monotonic", return_value=100.0):
+        cache.set("short", 1)
+        cache.set("long", 2, ttl=1000)
+    with patch("app.services.cache.time.monotonic", return_value=111.0):
+        assert cache.get("short") is None
+        assert cache.get("long") == 2
@@ -0,0 +1,60 @@
+import asyncio
+from app.services.chat_state import MemoryChatStateStore, RedisChatStateStore
+
+KEYS = ("location", "date", "budget")
+
+def test_advance_returns_next_unanswered_key():
+    store = MemoryChatStateStore()
+    assert asyncio.run(store.advance("u1", {}, KEYS)) == ("location", None)
+    assert asyncio.run(store.advance("u1", {"location": "Paris", "budget": "low"}, KEYS)) == ("date", None)
+
+def test_advance_returns_and_clears_completed_state():
+    store = MemoryChatStateStore()
+    asyncio.run(store.advance("u1", {"location": "Paris", "date": "May"}, KEYS))
+    next_key, state = asyncio.run(store.advance("u1", {"budget": "low"}, KEYS))
+    assert next_key is None
+    assert state == {"location": "Paris", "date": "May", "budget": "low"}
+    # Conversation starts over afterwards
+    assert asyncio.run(store.advance("u1", {}, KEYS)) == ("location", None)
+
+def test_abandoned_conversations_are_bounded():
+    store = MemoryChatStateStore(maxsize=2, ttl=1800)
+    for user_id in ("u1", "u2", "u3"):
+        asyncio.run(store.advance(user_id, {"location": "Paris"}, KEYS))
+    # Oldest conversation was evicted and starts over
+    assert asyncio.run(store.advance("u1", {}, KEYS)) == ("location", None)
+    assert asyncio.run(store.advance("u3", {}, KEYS)) == ("date", None)
+
+def test_redis_advance_merges_answers_and_returns_next_key(run_with_redis):
+    async def scenario(redis):
+        store = RedisChatStateStore(redis, ttl=1800)
+        assert await store.advance("u1", {}, KEYS) == ("location", None)
+        assert await store.advance("u1", {"location": "Paris", "budget": "low"}, KEYS) == ("date", None)
+        assert await redis.hgetall("chat:u1") == {"location": "Paris", "budget": "low"}
+
+    run_with_redis(scenario)
+
+def test_redis_answers_refresh_ttl(run_with_redis):
+    async def scenario(redis):
+        store = RedisChatStateStore(redis, ttl=1800)
+        await store.advance("u1", {"location": "Paris"}, KEYS)
+        await redis.expire("chat:u1", 5)
+        # A turn without answers leaves the expiry alone...
+        await store.advance("u1", {}, KEYS)
+        assert await redis.ttl("chat:u1") <= 5
+        # ...new answers push it back out to the full ttl
+        await store.advance("u1", {"date": "May"}, KEYS)
+        assert await redis.ttl("chat:u1") > 1000
+
+    run_with_redis(scenario)
+
+def test_redis_completed_state_is_returned_and_cleared(run_with_redis):
+    async def scenario(redis):
+        store = RedisChatStateStore(redis, ttl=1800)
+        await store.advance("u1", {"location": "Paris", "date": "May"}, KEYS)
+        next_key, state = await store.advance("u1", {"budget": "low"}, KEYS)
+        assert next_key is None
+        assert state == {"location": "Paris", "date": "May", "budget": "low"}
+        assert not await redis.exists("chat:u1")
+
+    run_with_redis(scenario)
@@ -0,0 +1,35 @@
+from dataclasses import replace
+from unittest.mock import patch
+from starlette.requests import Request
+import app.main as main
+
+def _request(headers=()):
+    return Request({
+        "type": "http",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": ("10.0.0.1", 5000),
+    })
+
+def _trusting(flag):
+    return patch.object(main, "settings", replace(main.settings, TRUST_PROXY_HEADERS=flag))
+
+def test_forwarded_header_ignored_when_not_trusted():
+    with _trusting(False):
+        assert main._client_ip(_request([("x-forwarded-for", "1.2.3.4")])) == "10.0.0.1"
+
+def test_rightmost_forwarded_entry_is_used_when_trusted():
+    # Entries left of the proxy's own are client-supplied and could be forged
+    with _trusting(True):
+        request = _request([("x-forwarded-for", "6.6.6.6, 1.2.3.4,  203.0.113.7 ")])
+        assert main._client_ip(request) == "203.0.113.7"
+
+def test_socket_peer_used_when_header_absent():
+    with _trusting(True):
+        assert main._client_ip(_request()) == "10.0.0.1"
+
+def test_client_ip_is_memoized_per_request():
+    with _trusting(True):
+        request = _request([("x-forwarded-for", "1.2.3.4")])
+        assert main._client_ip(request) == "1.2.3.4"
+        request.state.client_ip = "cached"
+        assert main._client_ip(request) == "cached"
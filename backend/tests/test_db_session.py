@@ -0,0 +1,25 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.session import _async_url, _engine_options
+
+def test_plain_postgres_url_uses_asyncpg():
+    url, connect_args = _async_url("postgres://u:p@db.example.com:5432/tours")
+    assert url.drivername == "postgresql+asyncpg"
+    assert url.password == "p"
+    assert connect_args == {}
+
+def test_sslmode_becomes_asyncpg_ssl_argument():
+    url, connect_args = _async_url("postgresql://u:p@db.example.com/tours?sslmode=require&application_name=api")
+    assert "sslmode" not in url.query
+    assert url.query["application_name"] == "api"
+    assert connect_args == {"ssl": "require"}
+    # What the dialect actually hands to asyncpg.connect()
+    engine = create_async_engine(url, **_engine_options(url, connect_args))
+    _, kwargs = engine.dialect.create_connect_args(engine.url)
+    kwargs.update(_engine_options(url, connect_args)["connect_args"])
+    assert "sslmode" not in kwargs
+    assert kwargs["ssl"] == "require"
+
+def test_sqlite_url_is_left_alone():
+    url, connect_args = _async_url("sqlite+aiosqlite:///tours.db")
+    assert str(url) == "sqlite+aiosqlite:///tours.db"
+    assert _engine_options(url, connect_args) == {"pool_pre_ping": True}
@@ -0,0 +1,49 @@
+import logging
+import os
+import subprocess
+import sys
+from app.main import _request_target
+from app.services.logging_config import _ContextFilter, log_context
+
+def _record(**extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", None, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_filter_stamps_request_context():
+    token = log_context.set({"method": "GET", "client_ip": "1.2.3.4"})
+    try:
+        record = _record(client_ip="explicit")
+        assert _ContextFilter().filter(record)
+    finally:
+        log_context.reset(token)
+    assert record.method == "GET"
+    assert record.client_ip == "explicit"  # caller extras win
+
+def test_filter_is_noop_outside_a_request():
+    record = _record()
+    assert _ContextFilter().filter(record)
+    assert not hasattr(record, "method")
+
+def test_request_target_keeps_the_query_string():
+    assert _request_target({"path": "/tours/", "query_string": b"limit=2&cursor=4"}) == "/tours/?limit=2&cursor=4"
+    assert _request_target({"path": "/chat", "query_string": b""}) == "/chat"
+    assert _request_target({"path": "/chat"}) == "/chat"
+
+def test_records_after_app_shutdown_are_still_written():
+    # Fresh interpreter: pytest's own root handlers keep setup_logging() from
+    # installing the queue here, and the atexit path needs a real exit
+    script = (
+        "from app.services.logging_config import flush_log_listener, setup_logging\n"
+        "logger = setup_logging()\n"
+        "logger.warning('during app')\n"
+        "flush_log_listener()  # what the lifespan does on shutdown\n"
+        "logger.warning('after shutdown')\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True, text=True, timeout=30,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    assert "during app" in result.stderr
+    assert "after shutdown" in result.stderr
@@ -0,0 +1,165 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+import httpx
+import pytest
+from fastapi import HTTPException
+from app.services import perplexity_service as service
+
+@pytest.fixture(autouse=True)
+def _fresh_state():
+    service._responses.clear()
+    service._inflight.clear()
+    yield
+    service._responses.clear()
+    service._inflight.clear()
+
+def test_ttl_override_is_honoured_on_reuse():
+    calls = []
+
+    async def upstream(prompt, model, retries, delay):
+        calls.append(prompt)
+        return f"reply {len(calls)}"
+
+    with patch.object(service, "_call_with_retries", upstream):
+        with patch("app.services.cache.time.monotonic", return_value=100.0):
+            assert asyncio.run(service.safe_perplexity_call("itinerary", ttl=86400)) == "reply 1"
+            assert asyncio.run(service.safe_perplexity_call("quick question")) == "reply 2"
+        # Past the 300s default but well inside the per-call ttl
+        with patch("app.services.cache.time.monotonic", return_value=1000.0):
+            assert asyncio.run(service.safe_perplexity_call("itinerary", ttl=86400)) == "reply 1"
+            assert asyncio.run(service.safe_perplexity_call("quick question")) == "reply 3"
+    assert calls == ["itinerary", "quick question", "quick question"]
+
+class _Upstream:
+    """Stub for _call_with_retries that blocks until released"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self, prompt, model, retries, delay):
+        self.calls.append((prompt, model))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return f"{model}: {prompt}"
+
+def test_concurrent_identical_prompts_share_one_call():
+    async def scenario():
+        upstream = _Upstream()
+        with patch.object(service, "_call_with_retries", upstream):
+            callers = [asyncio.create_task(service.safe_perplexity_call("Paris")) for _ in range(5)]
+            await asyncio.sleep(0)
+            upstream.release.set()
+            results = await asyncio.gather(*callers)
+        assert upstream.calls == [("Paris", service.settings.PERPLEXITY_MODEL)]
+        assert len(set(results)) == 1
+        await asyncio.sleep(0)
+        assert service._inflight == {}
+
+    asyncio.run(scenario())
+
+def test_different_models_do_not_coalesce():
+    async def scenario():
+        upstream = _Upstream()
+        upstream.release.set()
+        with patch.object(service, "_call_with_retries", upstream):
+            a, b = await asyncio.gather(
+                service.safe_perplexity_call("Paris", model="sonar"),
+                service.safe_perplexity_call("Paris", model="sonar-pro"),
+            )
+        assert (a, b) == ("sonar: Paris", "sonar-pro: Paris")
+        assert len(upstream.calls) == 2
+
+    asyncio.run(scenario())
+
+def test_failed_call_is_neither_cached_nor_left_in_flight():
+    async def scenario():
+        upstream = _Upstream(error=RuntimeError("upstream down"))
+        with patch.object(service, "_call_with_retries", upstream):
+            callers = [asyncio.create_task(service.safe_perplexity_call("Paris")) for _ in range(3)]
+            await asyncio.sleep(0)
+            upstream.release.set()
+            results = await asyncio.gather(*callers, return_exceptions=True)
+            assert all(isinstance(r, RuntimeError) for r in results)
+            await asyncio.sleep(0)
+            assert service._inflight == {}
+            assert len(service._responses) == 0
+            # The next caller tries upstream again
+            upstream.error = None
+            assert await service.safe_perplexity_call("Paris") == f"{service.settings.PERPLEXITY_MODEL}: Paris"
+        assert len(upstream.calls) == 2
+
+    asyncio.run(scenario())
+
+def test_cancelling_one_caller_does_not_cancel_the_others():
+    async def scenario():
+        upstream = _Upstream()
+        with patch.object(service, "_call_with_retries", upstream):
+            first = asyncio.create_task(service.safe_perplexity_call("Paris"))
+            second = asyncio.create_task(service.safe_perplexity_call("Paris"))
+            await asyncio.sleep(0)
+            first.cancel()
+            await asyncio.sleep(0)
+            upstream.release.set()
+            assert await second == f"{service.settings.PERPLEXITY_MODEL}: Paris"
+        assert first.cancelled()
+        assert len(upstream.calls) == 1
+
+    asyncio.run(scenario())
+
+def _rate_limited():
+    request = httpx.Request("POST", "https://api.perplexity.ai/chat/completions")
+    return service.openai.RateLimitError("slow down", response=httpx.Response(429, request=request), body=None)
+
+def _api_error():
+    request = httpx.Request("POST", "https://api.perplexity.ai/chat/completions")
+    return service.openai.APIError("boom", request=request, body=None)
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+class _FakeClient:
+    """get_client() stand-in whose create() plays back errors, then a reply"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _completion(outcome)
+
+def _call(client, sleeps):
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    with patch.object(service, "get_client", lambda: client), patch.object(service.asyncio, "sleep", fake_sleep):
+        return asyncio.run(service.safe_perplexity_call("Paris", retries=3, delay=2))
+
+def test_rate_limit_backs_off_then_succeeds():
+    client, sleeps = _FakeClient(_rate_limited(), "itinerary"), []
+    assert _call(client, sleeps) == "itinerary"
+    assert sleeps == [2]
+
+def test_rate_limit_exhausted_maps_to_429():
+    client, sleeps = _FakeClient(_rate_limited(), _rate_limited(), _rate_limited()), []
+    with pytest.raises(HTTPException) as exc:
+        _call(client, sleeps)
+    assert exc.value.status_code == 429
+    assert sleeps == [2, 4]  # exponential backoff between attempts
+    assert client.calls == 3
+
+def test_api_error_retries_then_maps_to_500():
+    client, sleeps = _FakeClient(_api_error(), _api_error(), _api_error()), []
+    with pytest.raises(HTTPException) as exc:
+        _call(client, sleeps)
+    assert exc.value.status_code == 500
+    assert client.calls == 3
+    assert sleeps == []
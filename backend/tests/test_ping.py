@@ -10,3 +10,13 @@ def test_ping_success():
     data = response.json()
     assert data["status"] == "ok"
     assert data["service"] == "journey-backend"
+
+def test_ping_head_has_length_but_no_body():
+    response = client.head("/ping")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "43"
+    assert response.content == b""
+
+def test_ping_post_falls_through_to_routing():
+    # Only GET/HEAD are short-circuited; there is no /ping route behind it
+    assert client.post("/ping").status_code == 404
@@ -0,0 +1,53 @@
+from unittest.mock import patch
+import fakeredis
+from app.main import _RATE_LIMIT_ERRORS, _window_text
+from app.services.rate_limit import RedisSlidingWindowLimiter, TokenBucketLimiter
+
+def test_bucket_allows_up_to_capacity():
+    limiter = TokenBucketLimiter(capacity=3, per_seconds=60)
+    assert all(limiter.hit("1.2.3.4", now=0.0) for _ in range(3))
+    assert not limiter.hit("1.2.3.4", now=0.0)
+    # Other clients have their own bucket
+    assert limiter.hit("5.6.7.8", now=0.0)
+
+def test_bucket_refills_over_time():
+    limiter = TokenBucketLimiter(capacity=3, per_seconds=60)
+    for _ in range(3):
+        limiter.hit("1.2.3.4", now=0.0)
+    assert not limiter.hit("1.2.3.4", now=10.0)
+    assert limiter.hit("1.2.3.4", now=20.0)  # one token every 20s
+
+def test_evict_idle_buckets():
+    limiter = TokenBucketLimiter(capacity=3, per_seconds=60)
+    limiter.hit("old", now=0.0)
+    limiter.hit("new", now=50.0)
+    assert limiter.evict_idle(now=60.0) == 1
+    assert set(limiter.buckets) == {"new"}
+
+def test_429_message_comes_from_the_matched_rule():
+    assert _RATE_LIMIT_ERRORS["/chat"] == "Rate limit exceeded: 10 per 1 minute"
+    assert _window_text(3600.0) == "60 minutes"
+    assert _window_text(1.5) == "1.5 seconds"
+
+def test_redis_window_enforces_limit_and_slides(run_with_redis):
+    async def scenario(redis):
+        limiter = RedisSlidingWindowLimiter(redis, "/chat", limit=3, per_seconds=60)
+        with patch("app.services.rate_limit.time.time", return_value=1000.0):
+            assert [await limiter.allow("1.2.3.4") for _ in range(4)] == [True, True, True, False]
+            assert await limiter.allow("5.6.7.8")
+        # Rejected requests aren't recorded, so the window frees up 60s later
+        with patch("app.services.rate_limit.time.time", return_value=1060.5):
+            assert await limiter.allow("1.2.3.4")
+
+    run_with_redis(scenario)
+
+def test_redis_failure_fails_open(run_with_redis):
+    server = fakeredis.FakeServer()
+    server.connected = False
+
+    async def scenario(redis):
+        limiter = RedisSlidingWindowLimiter(redis, "/chat", limit=1, per_seconds=60)
+        assert await limiter.allow("1.2.3.4")
+        assert await limiter.allow("1.2.3.4")
+
+    run_with_redis(scenario, server)
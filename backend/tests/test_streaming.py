@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.perplexity_service import _iter_stream_deltas
+
+client = TestClient(app)
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+class _StubStream:
+    """Stands in for openai's AsyncStream: yields chunks, then optionally fails"""
+
+    def __init__(self, texts, error=None):
+        self._texts = texts
+        self._error = error
+        self.closed = False
+
+    async def __aiter__(self):
+        for text in self._texts:
+            yield _chunk(text)
+        if self._error is not None:
+            raise self._error
+
+    async def close(self):
+        self.closed = True
+
+def _open(stream):
+    async def open_stream(prompt):
+        return _iter_stream_deltas(stream)
+    return open_stream
+
+def test_stream_ends_with_done_marker():
+    stream = _StubStream(["Day 1:", " Paris\nDay 2"])
+    with patch("app.main.open_perplexity_stream", _open(stream)):
+        response = client.post("/legacy_chat?stream=true", json={"query": "Paris"})
+    assert response.status_code == 200
+    assert response.text == "data: Day 1:\n\ndata:  Paris\ndata: Day 2\n\ndata: [DONE]\n\n"
+    assert stream.closed
+
+def test_stream_interrupted_upstream_ends_with_error_event():
+    stream = _StubStream(["Day 1:"], error=ConnectionError("reset"))
+    with patch("app.main.open_perplexity_stream", _open(stream)):
+        response = client.post("/legacy_chat?stream=true", json={"query": "Paris"})
+    assert response.text.startswith("data: Day 1:\n\n")
+    assert response.text.endswith("event: error\ndata: Upstream stream interrupted\n\n")
+    assert "[DONE]" not in response.text
+    assert stream.closed
+
+def test_iter_stream_deltas_propagates_errors():
+    stream = _StubStream(["a"], error=ConnectionError("reset"))
+
+    async def consume():
+        return [delta async for delta in _iter_stream_deltas(stream)]
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(consume())
+    assert stream.closed
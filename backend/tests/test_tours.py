@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.db.session import Base, get_db
+from app.main import app
+from app.routers.tours import _pages
+
+@pytest.fixture
+def client(tmp_path):
+    # Throwaway SQLite file per test; NullPool so no connection outlives the
+    # event loop that opened it
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tours.db'}", poolclass=NullPool)
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_get_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    _pages.clear()
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+    _pages.clear()
+
+def _create(client, name="Old Town walk"):
+    response = client.post("/tours/", json={"name": name, "location": "Prague"})
+    assert response.status_code == 201
+    return response.json()
+
+def test_get_sends_etag_and_cache_control(client):
+    tour = _create(client)
+    response = client.get(f"/tours/{tour['id']}")
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('W/"')
+    assert response.headers["cache-control"] == "no-cache"
+
+def test_matching_if_none_match_returns_304(client):
+    tour = _create(client)
+    etag = client.get(f"/tours/{tour['id']}").headers["etag"]
+    for header in (etag, etag.removeprefix("W/"), f'"other", {etag}', "*"):
+        response = client.get(f"/tours/{tour['id']}", headers={"If-None-Match": header})
+        assert response.status_code == 304, header
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+def test_stale_etag_gets_full_body(client):
+    _create(client)
+    etag = client.get("/tours/").headers["etag"]
+    _create(client, "Castle tour")
+    response = client.get("/tours/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+def test_list_pages_follow_next_cursor(client):
+    ids = [_create(client, f"tour {i}")["id"] for i in range(5)]
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = client.get("/tours/", params=params)
+        assert response.status_code == 200
+        seen += [tour["id"] for tour in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == ids
+
+def test_list_defaults_to_50(client):
+    client.post("/tours/bulk", json=[{"name": f"tour {i}", "location": "Prague"} for i in range(51)])
+    response = client.get("/tours/")
+    assert len(response.json()) == 50
+    assert response.headers["x-next-cursor"] == str(response.json()[-1]["id"])
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 201}, {"cursor": "abc"}])
+def test_list_rejects_out_of_range_params(client, params):
+    assert client.get("/tours/", params=params).status_code == 422
+
+def test_create_invalidates_cached_pages(client):
+    _create(client)
+    assert len(client.get("/tours/").json()) == 1
+    _create(client, "Castle tour")
+    assert len(client.get("/tours/").json()) == 2
+
+def test_bulk_create_returns_ids(client):
+    payload = [{"name": f"tour {i}", "location": "Prague"} for i in range(3)]
+    response = client.post("/tours/bulk", json=payload)
+    assert response.status_code == 201
+    created = response.json()
+    assert [tour["name"] for tour in created] == ["tour 0", "tour 1", "tour 2"]
+    assert all(isinstance(tour["id"], int) for tour in created)
+    assert [tour["id"] for tour in client.get("/tours/").json()] == [tour["id"] for tour in created]
+
+@pytest.mark.parametrize("count", [0, 501])
+def test_bulk_create_rejects_empty_and_oversized_batches(client, count):
+    payload = [{"name": f"tour {i}", "location": "Prague"} for i in range(count)]
+    assert client.post("/tours/bulk", json=payload).status_code == 422